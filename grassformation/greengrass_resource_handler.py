@@ -3,8 +3,16 @@
 ''' Defines the lambda functions for managing CloudFormation custom resources of
 AWS Greengrass. '''
 
+import json
+import hashlib
 import botocore
 from utils import change_requires_update, filter_dictionary
+from utils import planning
+
+# Cleaned collection entries by resource collection key and content hash,
+# shared by the handlers of the container
+CLEANED_ENTRY_CACHE_SIZE = 1024
+cleaned_entry_cache = {}
 
 class CollectionHandler:
     ''' Instances of this class manages Greengrass CloudFormation resource
@@ -19,15 +27,17 @@ class CollectionHandler:
     - CoreDefinition
     '''
 
-    def __init__(self, logger, resource_collection_key, id_key,
+    def __init__(self, request, resource_collection_key, id_key,
                  clean_resource_definition,
                  create_aws_function, create_version_aws_function,
-                 update_aws_function, delete_aws_function, get_aws_function):
+                 update_aws_function, delete_aws_function, get_aws_function,
+                 get_version_aws_function):
         '''
         Initializes the resource collection handler.
 
         Params:
-          - logger (logging.Logger): The logger instance.
+          - request (crhelper.RequestContext): The state of the request
+            served by this handler instance.
           - resource_collection_key (str): The key of the Greengrass resource
             collection in the CloudFormation resource definition
           - id_key (str): The key of the Greengrass resource id in update/delete
@@ -43,8 +53,13 @@ class CollectionHandler:
             for updating the resource definition.
           - delete_aws_function (func): The Greengrass API function responsible
             for deleting the resource definition.
+          - get_aws_function (func): The Greengrass API function responsible
+            for getting the resource definition.
+          - get_version_aws_function (func): The Greengrass API function responsible
+            for getting the resource definition version.
         '''
-        self.logger = logger
+        self.request = request
+        self.logger = request.logger
         self.resource_collection_key = resource_collection_key
         self.id_key = id_key
         self.clean_resource_definition = clean_resource_definition
@@ -53,9 +68,23 @@ class CollectionHandler:
         self.update_aws_function = update_aws_function
         self.delete_aws_function = delete_aws_function
         self.get_aws_function = get_aws_function
+        self.get_version_aws_function = get_version_aws_function
+
+    def clean_cached_resource_definition(self, resource_definition):
+        ''' Cleans a single collection entry, reusing the result of an earlier
+        request with the same content (eg. an entry of a shared fragment). '''
+        content = json.dumps(resource_definition, sort_keys=True).encode('utf-8')
+        key = (self.resource_collection_key, hashlib.sha1(content).hexdigest())
+        cleaned = cleaned_entry_cache.get(key)
+        if cleaned is None:
+            cleaned = self.clean_resource_definition(resource_definition)
+            if len(cleaned_entry_cache) >= CLEANED_ENTRY_CACHE_SIZE:
+                cleaned_entry_cache.clear()
+            cleaned_entry_cache[key] = cleaned
+        return cleaned
 
     def clean_resource_definition_collection(self, resource_definition_collection):
-        return [self.clean_resource_definition(res) for res in resource_definition_collection]
+        return [self.clean_cached_resource_definition(res) for res in resource_definition_collection]
 
     def create(self, event, context):
         params = {}
@@ -77,31 +106,103 @@ class CollectionHandler:
         response.pop('ResponseMetadata', None)
         return response
 
-    def update(self, event, context):
+    def get_applied_properties(self, identifier, reads):
+        ''' Returns the name and the cleaned collection of the latest version
+        of the resource definition, read from the Greengrass API. The read
+        calls are appended to reads. '''
+        params = { self.id_key: identifier }
+        reads.append((self.get_aws_function, params))
+        definition = self.get_current_definition(identifier)
+        properties = { 'Name': definition.get('Name') }
+        if definition.get('LatestVersion'):
+            # eg. CoreDefinitionId -> CoreDefinitionVersionId
+            params = {
+                self.id_key: identifier,
+                self.id_key[:-len('Id')] + 'VersionId': definition['LatestVersion']
+            }
+            reads.append((self.get_version_aws_function, params))
+            version = self.get_version_aws_function(**params)
+            collection = version.get('Definition', {}).get(self.resource_collection_key)
+            if collection is not None:
+                properties[self.resource_collection_key] = collection
+        return properties
+
+    def compared_properties(self, event, reads):
+        ''' Returns the old and new properties to compare in an update request.
+        After a dry run the old properties were never applied, so the live
+        resource definition is compared with the cleaned new properties. '''
+        if not planning.follows_dry_run(event):
+            return event['OldResourceProperties'], event['ResourceProperties']
+        self.logger.info('Update follows a dry run, comparing with the applied definition')
+        old_properties = self.get_applied_properties(event['PhysicalResourceId'], reads)
+        properties = dict(event['ResourceProperties'])
+        if self.resource_collection_key in properties:
+            properties[self.resource_collection_key] = \
+                self.clean_resource_definition_collection(properties[self.resource_collection_key])
+        return old_properties, properties
+
+    def plan_update(self, event):
+        ''' Plans an update request.
+
+        Returns:
+            A tuple of the (aws_function, params) read calls made while
+            planning, and the ordered (aws_function, params) calls that modify
+            the resource.
+        '''
+        reads = []
+        calls = []
         physical_resource_id = event['PhysicalResourceId']
+        old_properties, properties = self.compared_properties(event, reads)
         requires_new_version = self.resource_collection_key in event['ResourceProperties'] and \
                                change_requires_update(self.logger,
                                                       [self.resource_collection_key],
-                                                      event['OldResourceProperties'],
-                                                      event['ResourceProperties'])
+                                                      old_properties,
+                                                      properties)
         if requires_new_version:
             self.logger.info('Resource requires new version')
             params = filter_dictionary(event['ResourceProperties'], [self.resource_collection_key])
             params[self.resource_collection_key] = self.clean_resource_definition_collection(params[self.resource_collection_key])
             params[self.id_key] = physical_resource_id
-            self.create_version_aws_function(**params)
+            calls.append((self.create_version_aws_function, params))
 
         requires_rename = change_requires_update(self.logger,
                                                  ['Name'],
-                                                 event['OldResourceProperties'],
-                                                 event['ResourceProperties'])
+                                                 old_properties,
+                                                 properties)
         if requires_rename:
             self.logger.info('Resource is renamed')
             params = {
                 self.id_key: physical_resource_id,
                 'Name': event['ResourceProperties']['Name']
             }
-            self.update_aws_function(**params)
+            calls.append((self.update_aws_function, params))
+
+        return reads, calls
+
+    def plan(self, event, dry_run=False):
+        ''' Returns the description of all API calls of an update request in
+        order, including the reads and the final read of the resource
+        definition. With dry_run the calls of the update applying the dry run
+        request are described, which compares with the live definition. '''
+        if dry_run:
+            event = planning.apply_after_dry_run(event)
+        reads, calls = self.plan_update(event)
+        calls = reads + calls
+        calls.append((self.get_aws_function, { self.id_key: event['PhysicalResourceId'] }))
+        return planning.describe_calls(calls)
+
+    def update(self, event, context):
+        physical_resource_id = event['PhysicalResourceId']
+        if planning.dry_run_requested(event):
+            plan = self.plan(event, dry_run=True)
+            self.logger.info('Dry run, planned API calls: %s' % plan)
+            response = self.get_current_definition(physical_resource_id)
+            response['Plan'] = plan
+            return physical_resource_id, response
+
+        _, calls = self.plan_update(event)
+        for aws_function, params in calls:
+            aws_function(**params)
 
         response = self.get_current_definition(physical_resource_id)
         return physical_resource_id, response
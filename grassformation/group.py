@@ -3,9 +3,11 @@
 ''' Defines the lambda function for managing CloudFormation custom resource of
 AWS Greengrass Group. '''
 
+import functools
 import botocore
 from utils import crhelper
 from utils import keypath
+from utils import planning
 from utils import change_requires_update, filter_dictionary, val_to_bool
 
 # initialise logger
@@ -31,14 +33,14 @@ version_attributes = [
     'SubscriptionDefinitionVersionArn'
 ]
 
-def create(event, context):
+def create(request, event, context):
     params = {}
     params['Name'] = event['ResourceProperties']['Name']
     initial_version = filter_dictionary(event['ResourceProperties'], version_attributes)
     if initial_version:
-        logger.info('Group InitialVersion detected')
+        request.logger.info('Group InitialVersion detected')
         params['InitialVersion'] = initial_version
-    response = greengrass_client.create_group(**params)
+    response = request.client.create_group(**params)
     response.pop('ResponseMetadata', None)
     physical_resource_id = response['Id']
 
@@ -48,60 +50,122 @@ def create(event, context):
             'GroupId': physical_resource_id,
             'RoleArn': group_role_arn
         }
-        greengrass_client.associate_role_to_group(**params)
+        request.client.associate_role_to_group(**params)
 
     return physical_resource_id, response
 
-def get_current_definition(identifier):
+def get_current_definition(request, identifier):
     params = { 'GroupId': identifier }
-    response = greengrass_client.get_group(**params)
+    response = request.client.get_group(**params)
     response.pop('ResponseMetadata', None)
     return response
 
-def update(event, context):
+def get_applied_properties(request, identifier, reads):
+    ''' Returns the name and the version attributes of the latest version of
+    the group, read from the Greengrass API. The read calls are appended to
+    reads. '''
+    reads.append((request.client.get_group, { 'GroupId': identifier }))
+    definition = get_current_definition(request, identifier)
+    properties = { 'Name': definition.get('Name') }
+    if definition.get('LatestVersion'):
+        params = { 'GroupId': identifier, 'GroupVersionId': definition['LatestVersion'] }
+        reads.append((request.client.get_group_version, params))
+        version = request.client.get_group_version(**params)
+        properties.update(filter_dictionary(version.get('Definition', {}), version_attributes))
+    return properties
+
+def compared_properties(request, event, reads):
+    ''' Returns the old and new properties to compare in an update request.
+    After a dry run the old properties were never applied, so the live group
+    is compared with the new properties. '''
+    if not planning.follows_dry_run(event):
+        return event['OldResourceProperties'], event['ResourceProperties']
+    request.logger.info('Update follows a dry run, comparing with the applied group')
+    return get_applied_properties(request, event['PhysicalResourceId'], reads), event['ResourceProperties']
+
+def plan_update(request, event):
+    ''' Plans an update request.
+
+    Returns:
+        A tuple of the (aws_function, params) read calls made while planning,
+        and the ordered (aws_function, params) calls that modify the group.
+    '''
+    reads = []
+    calls = []
     physical_resource_id = event['PhysicalResourceId']
-    requires_new_version = change_requires_update(logger,
+    old_properties, properties = compared_properties(request, event, reads)
+    requires_new_version = change_requires_update(request.logger,
                                                   version_attributes,
-                                                  event['OldResourceProperties'],
-                                                  event['ResourceProperties'])
+                                                  old_properties,
+                                                  properties)
     if requires_new_version:
-        logger.info('Group requires new version')
+        request.logger.info('Group requires new version')
         params = filter_dictionary(event['ResourceProperties'], version_attributes)
         params['GroupId'] = physical_resource_id
-        greengrass_client.create_group_version(**params)
+        calls.append((request.client.create_group_version, params))
 
-    requires_rename = change_requires_update(logger,
+    requires_rename = change_requires_update(request.logger,
                                              ['Name'],
-                                             event['OldResourceProperties'],
-                                             event['ResourceProperties'])
+                                             old_properties,
+                                             properties)
     if requires_rename:
-        logger.info('Group is renamed')
+        request.logger.info('Group is renamed')
         params = {
             'GroupId': physical_resource_id,
             'Name': event['ResourceProperties']['Name']
         }
-        greengrass_client.update_group(**params)
+        calls.append((request.client.update_group, params))
+
+    return reads, calls
+
+def plan(request, event, dry_run=False):
+    ''' Returns the description of all API calls of an update request in
+    order, including the reads and the final read of the group. With dry_run
+    the calls of the update applying the dry run request are described, which
+    compares with the live group. '''
+    if dry_run:
+        event = planning.apply_after_dry_run(event)
+    reads, calls = plan_update(request, event)
+    calls = reads + calls
+    calls.append((request.client.get_group, { 'GroupId': event['PhysicalResourceId'] }))
+    return planning.describe_calls(calls)
+
+def update(request, event, context):
+    physical_resource_id = event['PhysicalResourceId']
+    if planning.dry_run_requested(event):
+        group_plan = plan(request, event, dry_run=True)
+        request.logger.info('Dry run, planned API calls: %s' % group_plan)
+        response = get_current_definition(request, physical_resource_id)
+        response['Plan'] = group_plan
+        return physical_resource_id, response
+
+    _, calls = plan_update(request, event)
+    for aws_function, params in calls:
+        aws_function(**params)
 
-    response = get_current_definition(physical_resource_id)
+    response = get_current_definition(request, physical_resource_id)
     return physical_resource_id, response
 
-def delete(event, context):
+def delete(request, event, context):
     physical_resource_id = event['PhysicalResourceId']
     if physical_resource_id == 'NONE':
         # This is a rollback from a failed create.  Nothing to do.
         return
     try:
-        greengrass_client.delete_group(GroupId=physical_resource_id)
+        request.client.delete_group(GroupId=physical_resource_id)
     except botocore.exceptions.ClientError as e:
         if e.response['Error']['Code'] == 'IdNotFoundException':
-            logger.warning('Requested to delete non existing resource.')
+            request.logger.warning('Requested to delete non existing resource.')
         else:
             raise e
     return
 
 def handler(event, context):
-    # update the logger with event info
-    global logger
-    logger = crhelper.log_config(event)
-    return crhelper.cfn_handler(event, context, create, update, delete, logger,
+    # bind the request state to the resource handlers
+    request = crhelper.RequestContext(event, context, crhelper.log_config(event),
+                                      greengrass_client)
+    return crhelper.cfn_handler(request,
+                                functools.partial(create, request),
+                                functools.partial(update, request),
+                                functools.partial(delete, request),
                                 init_failed)
@@ -24,32 +24,34 @@ except Exception as e:
     logger.error(e, exc_info=True)
     init_failed = e
 
-def core_handler(event, context):
-    ''' Lambda handler to manage AWS Greengrass CoreDefinition resources. '''
-    global logger
-    logger = crhelper.log_config(event)
+def core_collection_handler(request):
+    ''' Creates the handler of AWS Greengrass CoreDefinition resources. '''
 
     def clean_core(core):
         return keypath.replace(core, 'SyncShadow', lambda e: val_to_bool(e), inline=False)
 
-    handler = CollectionHandler(
-                    logger, 'Cores', 'CoreDefinitionId',
-                    clean_core,
-                    greengrass_client.create_core_definition,
-                    greengrass_client.create_core_definition_version,
-                    greengrass_client.update_core_definition,
-                    greengrass_client.delete_core_definition,
-                    greengrass_client.get_core_definition
-               )
-
-    crhelper.cfn_handler(event, context,
+    return CollectionHandler(
+        request, 'Cores', 'CoreDefinitionId',
+        clean_core,
+        request.client.create_core_definition,
+        request.client.create_core_definition_version,
+        request.client.update_core_definition,
+        request.client.delete_core_definition,
+        request.client.get_core_definition,
+        request.client.get_core_definition_version
+    )
+
+def core_handler(event, context):
+    ''' Lambda handler to manage AWS Greengrass CoreDefinition resources. '''
+    request = crhelper.RequestContext(event, context, crhelper.log_config(event),
+                                      greengrass_client)
+    handler = core_collection_handler(request)
+    crhelper.cfn_handler(request,
                          handler.create, handler.update, handler.delete,
-                         logger, init_failed)
+                         init_failed)
 
-def function_handler(event, context):
-    ''' Lambda handler to manage AWS Greengrass FunctionDefinition resources. '''
-    global logger
-    logger = crhelper.log_config(event)
+def function_collection_handler(request):
+    ''' Creates the handler of AWS Greengrass FunctionDefinition resources. '''
 
     def clean_func(function):
         res = function
@@ -63,46 +65,54 @@ def function_handler(event, context):
                               lambda e: int(e), inline=False)
         return res
 
-    handler = CollectionHandler(
-                    logger, 'Functions', 'FunctionDefinitionId',
-                    clean_func,
-                    greengrass_client.create_function_definition,
-                    greengrass_client.create_function_definition_version,
-                    greengrass_client.update_function_definition,
-                    greengrass_client.delete_function_definition,
-                    greengrass_client.get_function_definition
-               )
-
-    crhelper.cfn_handler(event, context,
+    return CollectionHandler(
+        request, 'Functions', 'FunctionDefinitionId',
+        clean_func,
+        request.client.create_function_definition,
+        request.client.create_function_definition_version,
+        request.client.update_function_definition,
+        request.client.delete_function_definition,
+        request.client.get_function_definition,
+        request.client.get_function_definition_version
+    )
+
+def function_handler(event, context):
+    ''' Lambda handler to manage AWS Greengrass FunctionDefinition resources. '''
+    request = crhelper.RequestContext(event, context, crhelper.log_config(event),
+                                      greengrass_client)
+    handler = function_collection_handler(request)
+    crhelper.cfn_handler(request,
                          handler.create, handler.update, handler.delete,
-                         logger, init_failed)
+                         init_failed)
 
-def logger_handler(event, context):
-    ''' Lambda handler to manage AWS Greengrass LoggerDefinition resources. '''
-    global logger
-    logger = crhelper.log_config(event)
+def logger_collection_handler(request):
+    ''' Creates the handler of AWS Greengrass LoggerDefinition resources. '''
 
     def clean_logger(logger_def):
         return keypath.replace(logger_def, 'Space', lambda e: int(e), inline=False)
 
-    handler = CollectionHandler(
-                    logger, 'Loggers', 'LoggerDefinitionId',
-                    clean_logger,
-                    greengrass_client.create_logger_definition,
-                    greengrass_client.create_logger_definition_version,
-                    greengrass_client.update_logger_definition,
-                    greengrass_client.delete_logger_definition,
-                    greengrass_client.get_logger_definition
-               )
-
-    crhelper.cfn_handler(event, context,
+    return CollectionHandler(
+        request, 'Loggers', 'LoggerDefinitionId',
+        clean_logger,
+        request.client.create_logger_definition,
+        request.client.create_logger_definition_version,
+        request.client.update_logger_definition,
+        request.client.delete_logger_definition,
+        request.client.get_logger_definition,
+        request.client.get_logger_definition_version
+    )
+
+def logger_handler(event, context):
+    ''' Lambda handler to manage AWS Greengrass LoggerDefinition resources. '''
+    request = crhelper.RequestContext(event, context, crhelper.log_config(event),
+                                      greengrass_client)
+    handler = logger_collection_handler(request)
+    crhelper.cfn_handler(request,
                          handler.create, handler.update, handler.delete,
-                         logger, init_failed)
+                         init_failed)
 
-def resource_handler(event, context):
-    ''' Lambda handler to manage AWS Greengrass ResourceDefinition resources. '''
-    global logger
-    logger = crhelper.log_config(event)
+def resource_collection_handler(request):
+    ''' Creates the handler of AWS Greengrass ResourceDefinition resources. '''
 
     def clean_res(resource):
         res = resource
@@ -116,66 +126,90 @@ def resource_handler(event, context):
                               inline=False)
         return res
 
-    handler = CollectionHandler(
-                    logger, 'Resources', 'ResourceDefinitionId',
-                    clean_res,
-                    greengrass_client.create_resource_definition,
-                    greengrass_client.create_resource_definition_version,
-                    greengrass_client.update_resource_definition,
-                    greengrass_client.delete_resource_definition,
-                    greengrass_client.get_resource_definition
-               )
-
-    crhelper.cfn_handler(event, context,
+    return CollectionHandler(
+        request, 'Resources', 'ResourceDefinitionId',
+        clean_res,
+        request.client.create_resource_definition,
+        request.client.create_resource_definition_version,
+        request.client.update_resource_definition,
+        request.client.delete_resource_definition,
+        request.client.get_resource_definition,
+        request.client.get_resource_definition_version
+    )
+
+def resource_handler(event, context):
+    ''' Lambda handler to manage AWS Greengrass ResourceDefinition resources. '''
+    request = crhelper.RequestContext(event, context, crhelper.log_config(event),
+                                      greengrass_client)
+    handler = resource_collection_handler(request)
+    crhelper.cfn_handler(request,
                          handler.create, handler.update, handler.delete,
-                         logger, init_failed)
+                         init_failed)
 
-def subscription_handler(event, context):
-    ''' Lambda handler to manage AWS Greengrass SubscriptionDefinition resources. '''
-    global logger
-    logger = crhelper.log_config(event)
+def subscription_collection_handler(request):
+    ''' Creates the handler of AWS Greengrass SubscriptionDefinition resources. '''
 
     def clean_sub(subscription):
         return subscription
 
-    handler = CollectionHandler(
-                    logger, 'Subscriptions', 'SubscriptionDefinitionId',
-                    clean_sub,
-                    greengrass_client.create_subscription_definition,
-                    greengrass_client.create_subscription_definition_version,
-                    greengrass_client.update_subscription_definition,
-                    greengrass_client.delete_subscription_definition,
-                    greengrass_client.get_subscription_definition
-               )
-
-    crhelper.cfn_handler(event, context,
+    return CollectionHandler(
+        request, 'Subscriptions', 'SubscriptionDefinitionId',
+        clean_sub,
+        request.client.create_subscription_definition,
+        request.client.create_subscription_definition_version,
+        request.client.update_subscription_definition,
+        request.client.delete_subscription_definition,
+        request.client.get_subscription_definition,
+        request.client.get_subscription_definition_version
+    )
+
+def subscription_handler(event, context):
+    ''' Lambda handler to manage AWS Greengrass SubscriptionDefinition resources. '''
+    request = crhelper.RequestContext(event, context, crhelper.log_config(event),
+                                      greengrass_client)
+    handler = subscription_collection_handler(request)
+    crhelper.cfn_handler(request,
                          handler.create, handler.update, handler.delete,
-                         logger, init_failed)
+                         init_failed)
 
-def device_handler(event, context):
-    ''' Lambda handler to manage AWS Greengrass DeviceDefinition resources. '''
-    global logger
-    logger = crhelper.log_config(event)
+def device_collection_handler(request):
+    ''' Creates the handler of AWS Greengrass DeviceDefinition resources. '''
 
     def clean_device(device):
         return keypath.replace(device, 'SyncShadow', lambda e: val_to_bool(e), inline=False)
 
-    handler = CollectionHandler(
-                    logger, 'Devices', 'DeviceDefinitionId',
-                    clean_core,
-                    greengrass_client.create_device_definition,
-                    greengrass_client.create_device_definition_version,
-                    greengrass_client.update_device_definition,
-                    greengrass_client.delete_device_definition,
-                    greengrass_client.get_device_definition
-               )
-
-    crhelper.cfn_handler(event, context,
+    return CollectionHandler(
+        request, 'Devices', 'DeviceDefinitionId',
+        clean_device,
+        request.client.create_device_definition,
+        request.client.create_device_definition_version,
+        request.client.update_device_definition,
+        request.client.delete_device_definition,
+        request.client.get_device_definition,
+        request.client.get_device_definition_version
+    )
+
+def device_handler(event, context):
+    ''' Lambda handler to manage AWS Greengrass DeviceDefinition resources. '''
+    request = crhelper.RequestContext(event, context, crhelper.log_config(event),
+                                      greengrass_client)
+    handler = device_collection_handler(request)
+    crhelper.cfn_handler(request,
                          handler.create, handler.update, handler.delete,
-                         logger, init_failed)
+                         init_failed)
+
+RESOURCE_TYPE_KEY = 'GrassFormationResourceType'
+
+collection_handlers = {
+    'core': core_collection_handler,
+    'function': function_collection_handler,
+    'logger': logger_collection_handler,
+    'resource': resource_collection_handler,
+    'subscription': subscription_collection_handler,
+    'device': device_collection_handler
+}
 
 def dispatch_handler(event, context):
-    global logger
     logger = crhelper.log_config(event)
     handlers = {
         'core': core_handler,
@@ -187,15 +221,14 @@ def dispatch_handler(event, context):
         'group': group_handler
     }
     try:
-        TYPE_KEY = 'GrassFormationResourceType'
-        resource_type = event['ResourceProperties'].get(TYPE_KEY, None)
+        resource_type = event['ResourceProperties'].get(RESOURCE_TYPE_KEY, None)
         if not resource_type:
-            raise ValueError('Missing required key: {}'.format(TYPE_KEY))
+            raise ValueError('Missing required key: {}'.format(RESOURCE_TYPE_KEY))
         handler = handlers.get(resource_type.lower(), None)
         if not handler:
-            raise ValueError('Unkown resource type. Valid values: {}'.format(TYPE_KEY, handlers.keys()))
+            raise ValueError('Unkown resource type. Valid values: {}'.format(', '.join(handlers.keys())))
     except Exception as e:
         logger.error(e, exc_info=True)
-        crhelper.send(event, context, "FAILED", {}, None, init_failed, logger=logger, reason=e)
+        crhelper.send(event, context, "FAILED", {}, None, logger=logger, reason=e)
     else:
         handler(event, context)
@@ -5,6 +5,7 @@ NSP::GrassFormation resources. '''
 
 import botocore
 import os
+import json
 from utils import crhelper
 
 # initialise logger
@@ -28,15 +29,105 @@ def create_response(event, success, result):
     }
 
 RESOURCE_TYPE_PREFIX = 'NSP::GrassFormation::'
+FRAGMENT_RESOURCE_TYPE = RESOURCE_TYPE_PREFIX + 'Fragment'
+FRAGMENT_KEY = 'Fragment'
+
+collection_keys = [
+    'Cores',
+    'Devices',
+    'Functions',
+    'Loggers',
+    'Resources',
+    'Subscriptions'
+]
+
+def collect_fragments(template):
+    ''' Removes the fragment definitions from the template and returns their
+    properties by name. '''
+    resources = template.get('Resources', {})
+    fragments = {}
+    for name, resource in list(resources.items()):
+        if resource['Type'] == FRAGMENT_RESOURCE_TYPE:
+            fragments[name] = resource.get('Properties', {})
+            del resources[name]
+    return fragments
+
+def is_fragment_reference(entry):
+    return isinstance(entry, dict) and list(entry.keys()) == [FRAGMENT_KEY]
+
+def serialize_id(entry):
+    ''' Returns the Id of an entry as a hashable string. The Id can be an
+    unresolved intrinsic function (eg. Fn::Join) at transform time. '''
+    if isinstance(entry, dict) and 'Id' in entry:
+        return json.dumps(entry['Id'], sort_keys=True)
+    return None
+
+def resolve_collection(collection_key, entries, fragments):
+    ''' Replaces the fragment references in a collection with the entries of
+    the referred fragment.
+
+    A fragment reference is an entry with the single key `Fragment` holding
+    the name of a NSP::GrassFormation::Fragment resource of the template.
+    Fragment entries identical to an entry already in the collection are
+    dropped, fragment entries with the Id of a different entry raise
+    ValueError. The collections of fragments must be lists and can not refer
+    to other fragments. Entries defined in the collection itself are kept as they
+    are. '''
+    if not any(is_fragment_reference(entry) for entry in entries):
+        return entries
+
+    seen_entries = set()
+    seen_ids = set()
+    for entry in entries:
+        if not is_fragment_reference(entry):
+            seen_entries.add(json.dumps(entry, sort_keys=True))
+            entry_id = serialize_id(entry)
+            if entry_id is not None:
+                seen_ids.add(entry_id)
+
+    resolved = []
+    for entry in entries:
+        if not is_fragment_reference(entry):
+            resolved.append(entry)
+            continue
+        fragment_name = entry[FRAGMENT_KEY]
+        if fragment_name not in fragments:
+            raise ValueError('Unknown fragment: {}'.format(fragment_name))
+        fragment_entries = fragments[fragment_name].get(collection_key, [])
+        if not isinstance(fragment_entries, list):
+            raise ValueError('{} of fragment {} must be a list'.format(
+                collection_key, fragment_name))
+        for item in fragment_entries:
+            if is_fragment_reference(item):
+                raise ValueError('Fragment {} refers to another fragment, nested '
+                                 'fragments are not supported'.format(fragment_name))
+            serialized = json.dumps(item, sort_keys=True)
+            if serialized in seen_entries:
+                continue
+            item_id = serialize_id(item)
+            if item_id is not None:
+                if item_id in seen_ids:
+                    raise ValueError('Conflicting {} entries with Id: {}'.format(
+                        collection_key, item_id))
+                seen_ids.add(item_id)
+            seen_entries.add(serialized)
+            resolved.append(item)
+    return resolved
 
 def handle_template(request_id, template):
     new_resources = {}
+    fragments = collect_fragments(template)
 
     for name, resource in template.get('Resources', {}).items():
         resource_type = resource['Type']
         if resource_type.startswith(RESOURCE_TYPE_PREFIX):
             gf_resource_type = resource_type.split('::')[-1]
             props = resource['Properties']
+            for collection_key in collection_keys:
+                if isinstance(props.get(collection_key), list):
+                    props[collection_key] = resolve_collection(collection_key,
+                                                               props[collection_key],
+                                                               fragments)
             props['ServiceToken'] = DISPATCH_HANDLER_LAMBDA_ARN
             props['GrassFormationResourceType'] = gf_resource_type
             new_resources[name] = {
@@ -51,8 +142,7 @@ def handle_template(request_id, template):
     return template
 
 def handler(event, context):
-    # update the logger with event info
-    global logger
+    # use a request scoped logger with event info
     logger = crhelper.log_config({'RequestId': event['requestId']})
     try:
         result = handle_template(event['requestId'], event['fragment'])
@@ -0,0 +1,111 @@
+# grassformation/plan.py
+
+''' Command line tool that computes the AWS Greengrass API calls of update
+requests without executing them.
+
+Usage:
+    python plan.py [--region REGION] [--loglevel LEVEL] requests.json
+
+The input file contains a JSON list of update requests (or a single one) in
+the format received by the dispatch handler. Only the following keys are
+used, `PhysicalResourceId` and `LogicalResourceId` are optional:
+    {
+        "LogicalResourceId": "FunctionDefinition",
+        "PhysicalResourceId": "...",
+        "OldResourceProperties": { "Name": ..., "Functions": [...] },
+        "ResourceProperties": {
+            "GrassFormationResourceType": "Function",
+            "Name": ...,
+            "Functions": [...]
+        }
+    }
+
+The ordered list of the planned API calls with their payload sizes and a
+summary are printed to the standard output as JSON. '''
+
+import os
+import sys
+import json
+import argparse
+import collections
+import boto3
+from utils import crhelper
+from utils import planning
+
+# index and group create their Greengrass client when imported, which fails
+# without a region. No calls are made with it, so any region does.
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+from index import RESOURCE_TYPE_KEY, collection_handlers
+import group
+
+PLACEHOLDER_PHYSICAL_RESOURCE_ID = 'PLANNED'
+
+def plan_request(request):
+    ''' Returns the planned API calls of a single update request. '''
+    event = request.event
+    resource_type = event['ResourceProperties'].get(RESOURCE_TYPE_KEY, None)
+    if not resource_type:
+        raise ValueError('Missing required key: {}'.format(RESOURCE_TYPE_KEY))
+    if resource_type.lower() == 'group':
+        return group.plan(request, event)
+    create_handler = collection_handlers.get(resource_type.lower(), None)
+    if not create_handler:
+        raise ValueError('Unkown resource type: {}'.format(resource_type))
+    return create_handler(request).plan(event)
+
+def plan_requests(events, client, logger):
+    ''' Plans a list of update requests and summarizes the API calls. '''
+    resources = []
+    operations = collections.Counter()
+    payload_size = 0
+    for index, event in enumerate(events):
+        event = dict(event)
+        event.setdefault('RequestId', 'PLAN-{}'.format(index))
+        event.setdefault('PhysicalResourceId', PLACEHOLDER_PHYSICAL_RESOURCE_ID)
+        event.setdefault('LogicalResourceId', 'Resource{}'.format(index))
+        # The old properties given to the tool are taken as applied, so they
+        # are not compared with the live resource as after a dry run
+        event['OldResourceProperties'] = {
+            key: value for key, value in event.get('OldResourceProperties', {}).items()
+            if key != planning.DRY_RUN_KEY
+        }
+        request = crhelper.RequestContext(event, None, logger, client)
+        resource_plan = plan_request(request)
+        for call in resource_plan:
+            operations[call['Operation']] += 1
+            payload_size += call['PayloadSize']
+        resources.append({
+            'LogicalResourceId': event['LogicalResourceId'],
+            'Plan': resource_plan
+        })
+    return {
+        'Resources': resources,
+        'Summary': {
+            'Calls': sum(operations.values()),
+            'PayloadSize': payload_size,
+            'Operations': dict(operations)
+        }
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Plans the AWS Greengrass API '
+                                     'calls of update requests without executing them.')
+    parser.add_argument('requests', help='JSON file with the update requests.')
+    parser.add_argument('--region', default=os.environ['AWS_DEFAULT_REGION'],
+                        help='The AWS region of the client. No calls are made.')
+    parser.add_argument('--loglevel', default='warning', help='The log level.')
+    args = parser.parse_args(argv)
+
+    with open(args.requests) as f:
+        events = json.load(f)
+    if isinstance(events, dict):
+        events = [events]
+
+    logger = crhelper.log_config({'RequestId': 'PLAN'}, loglevel=args.loglevel)
+    client = boto3.client('greengrass', region_name=args.region)
+    result = plan_requests(events, client, logger)
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
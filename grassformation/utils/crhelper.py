@@ -12,16 +12,52 @@
 ###################################################################################################
 
 from __future__ import print_function
+import sys
 import traceback
 import logging
 import threading
-from time import sleep
+from time import sleep, time
 from datetime import datetime
 from botocore.vendored import requests
 import json
+from utils import profiling
+
+
+class RequestLoggerAdapter(logging.LoggerAdapter):
+    ''' Logger adapter of a single request with its own log level, so the
+    log level of a request does not affect the concurrent ones. '''
+
+    def __init__(self, logger, extra, level):
+        logging.LoggerAdapter.__init__(self, logger, extra)
+        self.level = level
+
+    def isEnabledFor(self, level):
+        return level >= self.level
+
+    def log(self, level, msg, *args, **kwargs):
+        # Logger.log checks the level of the shared logger again before it
+        # calls Logger._log, which would drop the records enabled only for
+        # this request. Logger._log creates the record with the caller info,
+        # exc_info and extra like Logger.log does, without the level check.
+        if self.isEnabledFor(level):
+            msg, kwargs = self.process(msg, kwargs)
+            if sys.version_info >= (3, 8):
+                # Report the caller of the adapter instead of this method
+                kwargs.setdefault('stacklevel', 2)
+            self.logger._log(level, msg, args, **kwargs)
+
+
+# The root logger handler and the boto log levels are shared by the container
+_log_config_lock = threading.Lock()
+_log_configured = False
 
 
 def log_config(event, loglevel=None, botolevel=None):
+    ''' Returns the logger of a request. loglevel applies only to the
+    returned logger. botolevel is process wide, as boto logs through its own
+    loggers. It is set on every request and defaults to error, so it only
+    affects the requests running while it is set. '''
+    global _log_configured
     if 'ResourceProperties' in event.keys():
         if 'loglevel' in event['ResourceProperties'] and not loglevel:
             loglevel = event['ResourceProperties']['loglevel']
@@ -35,13 +71,18 @@ def log_config(event, loglevel=None, botolevel=None):
     loglevel = getattr(logging, loglevel.upper(), 20)
     botolevel = getattr(logging, botolevel.upper(), 40)
     mainlogger = logging.getLogger()
-    mainlogger.setLevel(loglevel)
-    logging.getLogger('boto3').setLevel(botolevel)
-    logging.getLogger('botocore').setLevel(botolevel)
-    # Set log message format
-    logfmt = '[%(requestid)s][%(asctime)s][%(levelname)s] %(message)s \n'
-    mainlogger.handlers[0].setFormatter(logging.Formatter(logfmt))
-    return logging.LoggerAdapter(mainlogger, {'requestid': event['RequestId']})
+    with _log_config_lock:
+        if not _log_configured:
+            # Set log message format
+            logfmt = '[%(requestid)s][%(asctime)s][%(levelname)s] %(message)s \n'
+            if not mainlogger.handlers:
+                # Outside of lambda (eg. the plan tool) no handler is installed
+                logging.basicConfig()
+            mainlogger.handlers[0].setFormatter(logging.Formatter(logfmt))
+            _log_configured = True
+        logging.getLogger('boto3').setLevel(botolevel)
+        logging.getLogger('botocore').setLevel(botolevel)
+    return RequestLoggerAdapter(mainlogger, {'requestid': event['RequestId']}, loglevel)
 
 
 def send(event, context, responseStatus, responseData, physicalResourceId,
@@ -90,15 +131,62 @@ def send(event, context, responseStatus, responseData, physicalResourceId,
         raise
 
 
+class RequestContext(object):
+    ''' Holds the state of a single custom resource request.
+
+    Every request gets its own instance, so requests can be served
+    concurrently in the same process without sharing module level state.
+
+    Params:
+      - event (dict): The CloudFormation custom resource request.
+      - context: The lambda context object, or None outside of lambda.
+      - logger (logging.LoggerAdapter): The logger of the request.
+      - client: The AWS service client used to serve the request.
+    '''
+
+    def __init__(self, event, context, logger, client=None):
+        self.event = event
+        self.context = context
+        self.logger = logger
+        self.client = client
+        self.request_id = event.get('RequestId')
+        if context is not None:
+            self.deadline = time() + context.get_remaining_time_in_millis() / 1000.00
+        else:
+            self.deadline = None
+        self._response_lock = threading.Lock()
+        self._responded = False
+
+    def remaining_time(self):
+        ''' Returns the seconds left until the deadline, or None if unknown. '''
+        if self.deadline is None:
+            return None
+        return self.deadline - time()
+
+    def send(self, responseStatus, responseData, physicalResourceId, reason=None):
+        ''' Sends the response to CloudFormation. Only the first successfully
+        sent response of the request is sent, later ones (eg. from the timeout
+        timer) are discarded. '''
+        with self._response_lock:
+            if self._responded:
+                self.logger.warning("Response already sent, discarding %s response" %
+                                    responseStatus)
+                return
+            send(self.event, self.context, responseStatus, responseData,
+                 physicalResourceId, self.logger, reason=reason)
+            self._responded = True
+
+
 # Function that executes just before lambda excecution times out
-def timeout(event, context, logger):
-    logger.error("Execution is about to time out, sending failure message")
-    send(event, context, "FAILED", None, None, reason="Execution timed out",
-         logger=logger)
+def timeout(request):
+    request.logger.error("Execution is about to time out, sending failure message")
+    request.send("FAILED", None, None, reason="Execution timed out")
 
 
 # Handler function
-def cfn_handler(event, context, create, update, delete, logger, init_failed):
+def cfn_handler(request, create, update, delete, init_failed):
+
+    event, context, logger = request.event, request.context, request.logger
 
     logger.info("Lambda RequestId: %s CloudFormation RequestId: %s" %
                 (context.aws_request_id, event['RequestId']))
@@ -115,16 +203,21 @@ def cfn_handler(event, context, create, update, delete, logger, init_failed):
     logger.debug("EVENT: " + str(event))
     # handle init failures
     if init_failed:
-        send(event, context, "FAILED", responseData, physicalResourceId,
-             init_failed, logger=logger)
-        raise
+        request.send("FAILED", responseData, physicalResourceId,
+                     reason=init_failed)
+        raise init_failed
 
     # Setup timer to catch timeouts
-    t = threading.Timer((context.get_remaining_time_in_millis()/1000.00)-0.5,
-                        timeout, args=[event, context, logger])
+    t = threading.Timer(request.remaining_time() - 0.5, timeout, args=[request])
     t.start()
 
     try:
+        # Wrap custom resource handlers in the profiler if requested
+        profile_top_n = profiling.profile_config(event)
+        if profile_top_n:
+            create, update, delete = [profiling.profiled(f, profile_top_n, logger)
+                                      for f in (create, update, delete)]
+
         # Execute custom resource handlers
         logger.info("Received a %s Request" % event['RequestType'])
         if event['RequestType'] == 'Create':
@@ -136,14 +229,12 @@ def cfn_handler(event, context, create, update, delete, logger, init_failed):
 
         # Send response back to CloudFormation
         logger.info("Completed successfully, sending response to cfn")
-        send(event, context, "SUCCESS", responseData, physicalResourceId,
-             logger=logger)
+        request.send("SUCCESS", responseData, physicalResourceId)
 
     # Catch any exceptions, log the stacktrace, send a failure back to
     # CloudFormation and then raise an exception
     except Exception as e:
         logger.error(e, exc_info=True)
-        send(event, context, "FAILED", responseData, physicalResourceId,
-             reason=e, logger=logger)
+        request.send("FAILED", responseData, physicalResourceId, reason=e)
     finally:
         t.cancel()
@@ -0,0 +1,46 @@
+# utils/planning.py
+
+''' Utility functions for planning the AWS API calls of a request without
+executing them. '''
+
+import json
+from utils.dict_utils import val_to_bool
+
+DRY_RUN_KEY = 'dryrun'
+
+def dry_run_requested(event):
+    ''' Returns True if the request asks for the plan of its API calls instead
+    of executing them. '''
+    return val_to_bool(event.get('ResourceProperties', {}).get(DRY_RUN_KEY, False))
+
+def follows_dry_run(event):
+    ''' Returns True if the update request follows a dry run. CloudFormation
+    stores the properties of a dry run although they were never applied, so
+    the OldResourceProperties of the request do not describe the resource. '''
+    return val_to_bool(event.get('OldResourceProperties', {}).get(DRY_RUN_KEY, False))
+
+def apply_after_dry_run(event):
+    ''' Returns the update request that applies a dry run request, ie. the
+    one CloudFormation sends when the dryrun property is removed. '''
+    properties = event['ResourceProperties']
+    event = dict(event)
+    event['OldResourceProperties'] = properties
+    event['ResourceProperties'] = {
+        key: value for key, value in properties.items() if key != DRY_RUN_KEY
+    }
+    return event
+
+def describe_calls(calls):
+    ''' Describes a list of API calls as a json serializable plan.
+
+    Params:
+        calls: A list of (aws_function, params) tuples in execution order.
+
+    Returns:
+        A list of dicts with the `Operation` name and the `PayloadSize` of the
+        JSON encoded parameters of each call.
+    '''
+    return [{
+        'Operation': getattr(aws_function, '__name__', str(aws_function)),
+        'PayloadSize': len(json.dumps(params, sort_keys=True, default=str))
+    } for aws_function, params in calls]
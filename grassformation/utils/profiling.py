@@ -0,0 +1,128 @@
+# utils/profiling.py
+
+''' Opt-in profiling of the custom resource request handlers. '''
+
+import os
+import threading
+
+PROFILE_ENV_KEY = 'GRASSFORMATION_PROFILE'
+DEFAULT_TOP_N = 10
+
+# tracemalloc is process wide, concurrently profiled requests share it
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+def profile_config(event, default=None):
+    ''' Returns the number of hotspots to report for the request, or 0 if
+    profiling is disabled.
+
+    Profiling is enabled by the `profile` resource property or by the
+    GRASSFORMATION_PROFILE environment variable. The value can be either a
+    boolean-like string or the number of hotspots to report.
+
+    Params:
+        event: The CloudFormation custom resource request.
+        default: The value used if neither the resource property nor the
+            environment variable is set.
+
+    Returns:
+        The number of hotspots to report (int).
+    '''
+    value = event.get('ResourceProperties', {}).get('profile')
+    if value is None:
+        value = os.environ.get(PROFILE_ENV_KEY, default)
+    if value is None:
+        return 0
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        pass
+    if str(value).lower() in ['y', 'yes', 'true', 'on']:
+        return DEFAULT_TOP_N
+    return 0
+
+def format_hotspots(profiler, top_n):
+    ''' Formats the top_n functions by cumulative time as compact strings. The
+    frames of the profiler itself (eg. its disable method) are left out. '''
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(((key, value) for key, value in stats.items()
+                   if '_lsprof.Profiler' not in key[2]),
+                  key=lambda item: item[1][3], reverse=True)
+    hotspots = []
+    for (filename, line, func), (_, ncalls, tottime, cumtime, _) in rows[:top_n]:
+        hotspots.append('{:.4f}s/{:.4f}s x{} {}:{}({})'.format(
+            cumtime, tottime, ncalls, os.path.basename(filename), line, func))
+    return hotspots
+
+def profiled(func, top_n, logger):
+    ''' Wraps func so that each call is profiled with cProfile and tracemalloc.
+
+    The top_n hotspots (cumulative/own time, call count and location) and
+    the peak traced memory are logged when the call returns or raises. The
+    report is logged at warning level so it is visible with the default
+    log configuration. The profiling modules are imported only on the first
+    profiled call, so disabled profiling adds no cold start cost.
+
+    The peak memory is measured from the start of the call when no other
+    profiled call is running. tracemalloc is process wide, so the peak of
+    concurrently profiled calls includes the allocations of each other.
+
+    Params:
+        func: callable. The function to profile.
+        top_n: int. The number of hotspots to report.
+        logger: The logger instance used to emit the report.
+
+    Returns:
+        The wrapped function.
+    '''
+    name = getattr(getattr(func, 'func', func), '__name__', func)
+
+    def wrapper(*args, **kwargs):
+        import cProfile
+        _start_tracing()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this process
+            profiler = None
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                hotspots = ' | '.join(format_hotspots(profiler, top_n))
+            else:
+                hotspots = 'not available, another profiler is active'
+            peak = _stop_tracing()
+            logger.warning('Profile of %s: peak memory %.1f KiB; hotspots: %s',
+                           name, peak / 1024.0, hotspots)
+    return wrapper
+
+def _start_tracing():
+    import tracemalloc
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _tracing_started = True
+            elif hasattr(tracemalloc, 'reset_peak'):
+                # Tracing started elsewhere, measure the peak of this call only
+                tracemalloc.reset_peak()
+        _tracing_users += 1
+
+def _stop_tracing():
+    ''' Returns the peak traced memory and stops tracing if no other
+    profiled call needs it. '''
+    import tracemalloc
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _, peak = tracemalloc.get_traced_memory()
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+    return peak
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The lambda modules import each other as top level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'grassformation'))
+os.environ.setdefault('DISPATCH_HANDLER_LAMBDA_ARN',
+                      'arn:aws:lambda:us-east-1:123456789012:function:dispatch')
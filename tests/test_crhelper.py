@@ -0,0 +1,137 @@
+import json
+import logging
+import threading
+import time
+
+import pytest
+
+from utils import crhelper
+
+
+class FakeResponse:
+    reason = 'OK'
+
+
+class FakeRequests:
+    ''' Records the responses sent to CloudFormation. The first PUT of the
+    statuses in fail_statuses raises. '''
+
+    def __init__(self, fail_statuses=()):
+        self.lock = threading.Lock()
+        self.attempts = []
+        self.sent = []
+        self.fail_statuses = set(fail_statuses)
+
+    def put(self, url, data, headers):
+        body = json.loads(data)
+        with self.lock:
+            self.attempts.append((url, body))
+            if body['Status'] in self.fail_statuses:
+                self.fail_statuses.discard(body['Status'])
+                raise IOError('PUT failed')
+            self.sent.append((url, body))
+        return FakeResponse()
+
+
+class FakeContext:
+    aws_request_id = 'lambda-request'
+    log_stream_name = 'log-stream'
+
+    def __init__(self, remaining_millis=3000):
+        self.remaining_millis = remaining_millis
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_millis
+
+
+@pytest.fixture
+def fake_requests(monkeypatch):
+    fake = FakeRequests()
+    monkeypatch.setattr(crhelper, 'requests', fake)
+    return fake
+
+
+def make_event(name, request_type='Create', **properties):
+    return {
+        'RequestType': request_type,
+        'RequestId': 'request-' + name,
+        'ResponseURL': 'https://response/' + name,
+        'StackId': 'stack',
+        'LogicalResourceId': name,
+        'ResourceProperties': properties
+    }
+
+
+def make_request(event, remaining_millis=3000):
+    return crhelper.RequestContext(event, FakeContext(remaining_millis),
+                                   crhelper.log_config(event))
+
+
+def test_concurrent_requests_get_their_own_response(fake_requests):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def create(event, context):
+        # Both requests are in their handler at the same time
+        barrier.wait()
+        return event['LogicalResourceId'] + '-id', {'Name': event['LogicalResourceId']}
+
+    requests = [make_request(make_event(name)) for name in ('first', 'second')]
+    threads = [threading.Thread(target=crhelper.cfn_handler,
+                                args=(request, create, None, None, False))
+               for request in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(fake_requests.sent) == 2
+    for url, body in fake_requests.sent:
+        name = url.rsplit('/', 1)[1]
+        assert body['Status'] == 'SUCCESS'
+        assert body['RequestId'] == 'request-' + name
+        assert body['PhysicalResourceId'] == name + '-id'
+        assert body['Data'] == {'Name': name}
+
+
+def test_timeout_and_completion_send_one_response(fake_requests):
+    def slow_create(event, context):
+        time.sleep(0.4)
+        return 'id', {}
+
+    # The timer fires 0.5 s before the deadline, ie. after 0.1 s
+    request = make_request(make_event('slow'), remaining_millis=600)
+    crhelper.cfn_handler(request, slow_create, None, None, False)
+
+    assert [body['Status'] for _, body in fake_requests.attempts] == ['FAILED']
+    assert fake_requests.sent[0][1]['Reason'].startswith('Execution timed out')
+
+
+def test_failed_response_sent_after_success_put_raises(fake_requests):
+    fake_requests.fail_statuses.add('SUCCESS')
+    request = make_request(make_event('flaky'))
+    crhelper.cfn_handler(request, lambda event, context: ('id', {}), None, None, False)
+
+    assert [body['Status'] for _, body in fake_requests.attempts] == ['SUCCESS', 'FAILED']
+    assert [body['Status'] for _, body in fake_requests.sent] == ['FAILED']
+
+
+def test_request_log_level_is_not_shared(caplog):
+    debug_logger = crhelper.log_config(make_event('debug', loglevel='debug'))
+    default_logger = crhelper.log_config(make_event('default'))
+    with caplog.at_level(logging.WARNING):
+        # Only the root logger level is set to warning, capture everything
+        caplog.handler.setLevel(logging.NOTSET)
+        debug_logger.debug('visible')
+        default_logger.debug('hidden')
+        default_logger.warning('warning')
+    assert [record.getMessage() for record in caplog.records] == ['visible', 'warning']
+    assert [record.requestid for record in caplog.records] == ['request-debug', 'request-default']
+    assert all(record.filename == 'test_crhelper.py' for record in caplog.records)
+
+
+def test_boto_log_level_is_reset():
+    crhelper.log_config(make_event('boto', botolevel='debug'))
+    assert logging.getLogger('botocore').level == logging.DEBUG
+    crhelper.log_config(make_event('default'))
+    assert logging.getLogger('botocore').level == logging.ERROR
+    assert logging.getLogger('boto3').level == logging.ERROR
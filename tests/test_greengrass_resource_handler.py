@@ -0,0 +1,116 @@
+import logging
+
+from utils import crhelper
+from greengrass_resource_handler import CollectionHandler
+
+
+class FakeFunctionDefinitions:
+    ''' Keeps a single Greengrass FunctionDefinition in memory and records the
+    API calls made. '''
+
+    def __init__(self, name, functions):
+        self.name = name
+        self.versions = [functions]
+        self.calls = []
+
+    def create_function_definition_version(self, FunctionDefinitionId, Functions):
+        self.calls.append('create_function_definition_version')
+        self.versions.append(Functions)
+        return {}
+
+    def update_function_definition(self, FunctionDefinitionId, Name):
+        self.calls.append('update_function_definition')
+        self.name = Name
+        return {}
+
+    def get_function_definition(self, FunctionDefinitionId):
+        self.calls.append('get_function_definition')
+        return {
+            'Id': FunctionDefinitionId,
+            'Name': self.name,
+            'LatestVersion': str(len(self.versions)),
+            'LatestVersionArn': 'arn:version:{}'.format(len(self.versions))
+        }
+
+    def get_function_definition_version(self, FunctionDefinitionId, FunctionDefinitionVersionId):
+        self.calls.append('get_function_definition_version')
+        return {'Definition': {'Functions': self.versions[int(FunctionDefinitionVersionId) - 1]}}
+
+
+def make_handler(client, event):
+    logger = logging.LoggerAdapter(logging.getLogger(), {'requestid': 'test'})
+    request = crhelper.RequestContext(event, None, logger, client)
+    return CollectionHandler(
+        request, 'Functions', 'FunctionDefinitionId',
+        lambda function: function,
+        None,
+        client.create_function_definition_version,
+        client.update_function_definition,
+        None,
+        client.get_function_definition,
+        client.get_function_definition_version
+    )
+
+
+def update_event(old_properties, properties):
+    return {
+        'RequestType': 'Update',
+        'RequestId': 'test',
+        'PhysicalResourceId': 'definition-id',
+        'OldResourceProperties': old_properties,
+        'ResourceProperties': properties
+    }
+
+
+def update(client, old_properties, properties):
+    event = update_event(old_properties, properties)
+    return make_handler(client, event).update(event, None)
+
+
+def test_dry_run_keeps_attributes_and_makes_no_changes():
+    old = {'Name': 'functions', 'Functions': [{'Id': 'a'}]}
+    new = {'Name': 'functions', 'Functions': [{'Id': 'b'}], 'dryrun': 'true'}
+    client = FakeFunctionDefinitions('functions', [{'Id': 'a'}])
+    _, response = update(client, old, new)
+    assert client.versions == [[{'Id': 'a'}]]
+    assert response['LatestVersionArn'] == 'arn:version:1'
+    assert client.calls.count('get_function_definition_version') == 1
+    assert [call['Operation'] for call in response['Plan']] == [
+        'get_function_definition',
+        'get_function_definition_version',
+        'create_function_definition_version',
+        'get_function_definition'
+    ]
+
+
+def test_dry_run_after_dry_run_plans_against_the_live_definition():
+    dry_run = {'Name': 'functions', 'Functions': [{'Id': 'b'}], 'dryrun': 'true'}
+    new = {'Name': 'renamed', 'Functions': [{'Id': 'a'}], 'dryrun': 'true'}
+    client = FakeFunctionDefinitions('functions', [{'Id': 'a'}])
+    _, response = update(client, dry_run, new)
+    assert client.versions == [[{'Id': 'a'}]]
+    assert client.name == 'functions'
+    assert [call['Operation'] for call in response['Plan']] == [
+        'get_function_definition',
+        'get_function_definition_version',
+        'update_function_definition',
+        'get_function_definition'
+    ]
+
+
+def test_update_after_dry_run_applies_the_changes():
+    dry_run = {'Name': 'functions', 'Functions': [{'Id': 'b'}], 'dryrun': 'true'}
+    new = {'Name': 'functions', 'Functions': [{'Id': 'b'}]}
+    client = FakeFunctionDefinitions('functions', [{'Id': 'a'}])
+    _, response = update(client, dry_run, new)
+    assert client.versions[-1] == [{'Id': 'b'}]
+    assert 'update_function_definition' not in client.calls
+    assert response['LatestVersionArn'] == 'arn:version:2'
+
+
+def test_update_after_dry_run_without_changes():
+    dry_run = {'Name': 'functions', 'Functions': [{'Id': 'a'}], 'dryrun': 'true'}
+    new = {'Name': 'functions', 'Functions': [{'Id': 'a'}]}
+    client = FakeFunctionDefinitions('functions', [{'Id': 'a'}])
+    update(client, dry_run, new)
+    assert len(client.versions) == 1
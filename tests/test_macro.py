@@ -0,0 +1,104 @@
+import copy
+import os
+
+import pytest
+
+import macro
+
+yaml = pytest.importorskip('yaml')
+
+EXAMPLE_TEMPLATE = os.path.join(os.path.dirname(__file__), '..', 'examples', 'fullgrass.yaml')
+
+
+class CloudFormationLoader(yaml.SafeLoader):
+    ''' Loads the short form intrinsic functions as their long form, like
+    CloudFormation passes them to the macro. '''
+
+
+def construct_intrinsic(loader, tag_suffix, node):
+    name = 'Ref' if tag_suffix == 'Ref' else 'Fn::' + tag_suffix
+    if isinstance(node, yaml.ScalarNode):
+        value = loader.construct_scalar(node)
+        if tag_suffix == 'GetAtt':
+            value = value.split('.', 1)
+    elif isinstance(node, yaml.SequenceNode):
+        value = loader.construct_sequence(node, deep=True)
+    else:
+        value = loader.construct_mapping(node, deep=True)
+    return {name: value}
+
+
+CloudFormationLoader.add_multi_constructor('!', construct_intrinsic)
+
+
+def load_example():
+    with open(EXAMPLE_TEMPLATE) as f:
+        return yaml.load(f, Loader=CloudFormationLoader)
+
+
+def test_example_template_is_transformed_unchanged():
+    template = load_example()
+    original = copy.deepcopy(template)
+    result = macro.handler({'requestId': 'test', 'fragment': template}, None)
+    assert result['status'] == 'success'
+    resources = result['fragment']['Resources']
+    for name, resource in original['Resources'].items():
+        if not resource['Type'].startswith(macro.RESOURCE_TYPE_PREFIX):
+            continue
+        props = resources[name]['Properties']
+        assert resources[name]['Type'] == 'Custom::GrassFormation' + resource['Type'].split('::')[-1]
+        for key in macro.collection_keys:
+            if key in resource['Properties']:
+                assert props[key] == resource['Properties'][key]
+
+
+def test_fragment_with_intrinsic_ids():
+    logger_id = {'Fn::Join': ['_', [{'Ref': 'GroupNameParameter'}, 'Logger', 'Lambda']]}
+    shared_logger = {'Id': logger_id, 'Type': 'AWSCloudWatch', 'Component': 'Lambda', 'Level': 'INFO'}
+    template = {'Resources': {
+        'SharedLoggers': {
+            'Type': 'NSP::GrassFormation::Fragment',
+            'Properties': {'Loggers': [shared_logger]}
+        },
+        'LoggerDefinition': {
+            'Type': 'NSP::GrassFormation::Logger',
+            'Properties': {'Name': 'Loggers', 'Loggers': [
+                {'Fragment': 'SharedLoggers'},
+                {'Fragment': 'SharedLoggers'},
+                {'Id': {'Fn::Join': ['_', ['System', 'Logger']]}, 'Type': 'FileSystem',
+                 'Component': 'GreengrassSystem', 'Level': 'INFO', 'Space': 25600}
+            ]}
+        }
+    }}
+    result = macro.handle_template('test', template)
+    assert 'SharedLoggers' not in result['Resources']
+    loggers = result['Resources']['LoggerDefinition']['Properties']['Loggers']
+    assert loggers[0] == shared_logger
+    assert len(loggers) == 2
+
+
+def test_fragment_with_conflicting_id():
+    fragments = {'Shared': {'Functions': [{'Id': {'Ref': 'FunctionId'}, 'FunctionArn': 'a'}]}}
+    entries = [{'Fragment': 'Shared'}, {'Id': {'Ref': 'FunctionId'}, 'FunctionArn': 'b'}]
+    with pytest.raises(ValueError):
+        macro.resolve_collection('Functions', entries, fragments)
+
+
+def test_collection_without_fragments_is_kept():
+    entries = [{'Id': 'a'}, {'Id': 'a'}]
+    assert macro.resolve_collection('Functions', entries, {}) is entries
+
+
+def test_fragment_collection_must_be_a_list():
+    fragments = {'Shared': {'Functions': {'Fn::If': ['Condition', [{'Id': 'a'}], []]}}}
+    with pytest.raises(ValueError):
+        macro.resolve_collection('Functions', [{'Fragment': 'Shared'}], fragments)
+
+
+def test_nested_fragment_reference():
+    fragments = {
+        'Inner': {'Functions': [{'Id': 'a'}]},
+        'Outer': {'Functions': [{'Fragment': 'Inner'}]}
+    }
+    with pytest.raises(ValueError):
+        macro.resolve_collection('Functions', [{'Fragment': 'Outer'}], fragments)
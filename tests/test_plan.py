@@ -0,0 +1,50 @@
+import plan
+
+
+class RecordingClient:
+    ''' Greengrass client whose methods record that they were called. '''
+
+    def __init__(self):
+        self.called = []
+
+    def __getattr__(self, name):
+        def method(**params):
+            self.called.append(name)
+            return {}
+        method.__name__ = name
+        return method
+
+
+def test_plan_requests_summary_without_calls():
+    events = [
+        {
+            'LogicalResourceId': 'FunctionDefinition',
+            'OldResourceProperties': {'Name': 'functions', 'Functions': [{'Id': 'a'}],
+                                      'dryrun': 'true'},
+            'ResourceProperties': {'GrassFormationResourceType': 'Function',
+                                   'Name': 'renamed', 'Functions': [{'Id': 'b'}]}
+        },
+        {
+            'OldResourceProperties': {'Name': 'group'},
+            'ResourceProperties': {'GrassFormationResourceType': 'Group', 'Name': 'group',
+                                   'CoreDefinitionVersionArn': 'arn:core:1'}
+        }
+    ]
+    client = RecordingClient()
+    result = plan.plan_requests(events, client, plan.crhelper.log_config({'RequestId': 'test'}))
+
+    assert client.called == []
+    assert [resource['LogicalResourceId'] for resource in result['Resources']] == \
+        ['FunctionDefinition', 'Resource1']
+    summary = result['Summary']
+    assert summary['Operations'] == {
+        'create_function_definition_version': 1,
+        'update_function_definition': 1,
+        'get_function_definition': 1,
+        'create_group_version': 1,
+        'get_group': 1
+    }
+    assert summary['Calls'] == 5
+    assert summary['PayloadSize'] == sum(call['PayloadSize']
+                                         for resource in result['Resources']
+                                         for call in resource['Plan'])
@@ -0,0 +1,90 @@
+import logging
+
+import pytest
+
+from utils import profiling
+
+
+@pytest.fixture(autouse=True)
+def no_profile_env(monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_ENV_KEY, raising=False)
+
+
+def event(**properties):
+    return {'ResourceProperties': properties}
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('true', profiling.DEFAULT_TOP_N),
+    ('yes', profiling.DEFAULT_TOP_N),
+    ('5', 5),
+    (7, 7),
+    ('false', 0),
+    ('-3', 0),
+    ('not a number', 0),
+])
+def test_profile_config_property(value, expected):
+    assert profiling.profile_config(event(profile=value)) == expected
+
+
+def test_profile_config_absent():
+    assert profiling.profile_config(event()) == 0
+    assert profiling.profile_config({}) == 0
+
+
+def test_profile_config_env(monkeypatch):
+    monkeypatch.setenv(profiling.PROFILE_ENV_KEY, '3')
+    assert profiling.profile_config(event()) == 3
+
+
+def test_profile_config_property_overrides_env(monkeypatch):
+    monkeypatch.setenv(profiling.PROFILE_ENV_KEY, '3')
+    assert profiling.profile_config(event(profile='false')) == 0
+    assert profiling.profile_config(event(profile='8')) == 8
+
+
+def nested(n):
+    return sorted(range(n))
+
+
+def work(n):
+    return [nested(n) for _ in range(3)]
+
+
+def profile_records(caplog, func, *args):
+    logger = logging.getLogger('test_profiling')
+    wrapped = profiling.profiled(func, 2, logger)
+    with caplog.at_level(logging.WARNING, logger='test_profiling'):
+        try:
+            result = wrapped(*args)
+        finally:
+            records = [r for r in caplog.records if r.name == 'test_profiling']
+    return result, records
+
+
+def assert_single_report(records, name):
+    assert len(records) == 1
+    assert records[0].levelno == logging.WARNING
+    message = records[0].getMessage()
+    assert message.startswith('Profile of {}: peak memory '.format(name))
+    hotspots = message.split('hotspots: ', 1)[1].split(' | ')
+    assert len(hotspots) == 2
+    assert '_lsprof.Profiler' not in message
+    assert profiling._tracing_users == 0
+
+
+def test_profiled_logs_one_report(caplog):
+    result, records = profile_records(caplog, work, 1000)
+    assert len(result) == 3
+    assert_single_report(records, 'work')
+
+
+def test_profiled_logs_report_when_call_raises(caplog):
+    def failing(n):
+        work(n)
+        raise KeyError('failed')
+
+    with pytest.raises(KeyError):
+        profile_records(caplog, failing, 100)
+    records = [r for r in caplog.records if r.name == 'test_profiling']
+    assert_single_report(records, 'failing')